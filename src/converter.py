@@ -1,21 +1,57 @@
 """Converter module for converting Beat Saber maps to Audio Trip format."""
 
 import argparse
+import bisect
 import errno
+import functools
 import hashlib
 import json
+import math
 import os
 import os.path
 import random
 import shutil
-import zipfile
-from fractions import Fraction
+import struct
+import tempfile
+from collections.abc import Callable
 from pathlib import Path
-from typing import Any, BinaryIO, Literal, TextIO, cast, overload
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Final,
+    Literal,
+    Protocol,
+    TextIO,
+    cast,
+    overload,
+)
 
-import pyrfc6266
-import requests
-from mutagen.oggvorbis import OggVorbis
+if TYPE_CHECKING:
+    import requests
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speed-up, see the "fast" extra
+    orjson = None  # type: ignore[assignment]
+
+# Used when orjson is not installed; built once rather than per call. Our
+# maps are plain trees we build ourselves, so no circular check is needed
+JSON_ENCODER: Final[json.JSONEncoder] = json.JSONEncoder(
+    ensure_ascii=False, check_circular=False, separators=(",", ":")
+)
+
+# Buffer size for userspace file copies; 1 MiB comfortably beats the
+# smaller stdlib defaults for the multi-MB zips and songs we copy around
+COPY_BUFFER_SIZE: Final[int] = 1024 * 1024
+
+# Translation table for characters that are not allowed in Windows file names
+WINDOWS_ILLEGAL: Final[dict[int, int]] = str.maketrans(':<>|"?*', "_" * 7)
+
+# An Ogg page is at most 65307 bytes long, so the last page of a file always
+# starts within this many bytes of its end
+OGG_TAIL_SIZE: Final[int] = 64 * 1024
 
 
 # Taken from https://stackoverflow.com/a/600612/119527
@@ -54,12 +90,510 @@ def safe_open_w(
     return cast(TextIO | BinaryIO, open(path, mode))
 
 
+class SupportsReadinto(Protocol):
+    """A binary file-like object that can read into a caller's buffer."""
+
+    def readinto(self, buffer: bytearray, /) -> int | None:
+        """Read into "buffer", returning the number of bytes read."""
+        ...
+
+
+def copy_fileobj(
+    src: SupportsReadinto,
+    dst: BinaryIO,
+    buffer_size: int = COPY_BUFFER_SIZE,
+) -> None:
+    """
+    Copy everything left in "src" to "dst".
+
+    Unlike shutil.copyfileobj(), which allocates a new bytes object for every
+    chunk it reads, this reads into one reusable buffer of "buffer_size"
+    bytes.
+    """
+    buffer: bytearray = bytearray(buffer_size)
+    with memoryview(buffer) as view:
+        while read := src.readinto(buffer):
+            dst.write(view[:read])
+
+
+def extract_zip(
+    archive: os.PathLike[str] | str | BinaryIO, destination: Path
+) -> None:
+    """
+    Extract every member of the zip file "archive" into "destination".
+
+    Behaves like ZipFile.extractall(), but copies each member through
+    copy_fileobj()'s COPY_BUFFER_SIZE buffer rather than the small default
+    one of shutil.copyfileobj(), and decompresses the members in parallel;
+    zlib releases the GIL while it inflates, so the song and the difficulty
+    files really are extracted at the same time.
+    """
+    import zipfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    with zipfile.ZipFile(archive) as zip_ref:
+        # Later members with the same name win, as with extractall(). Keyed
+        # by the case-folded path, so that on case-insensitive file systems
+        # (i.e. Windows) two names differing only in case are still one
+        # file, rather than two workers writing the same file at once
+        to_extract: dict[str, tuple[Path, zipfile.ZipInfo]] = {}
+        for member in zip_ref.infolist():
+            # Sanitize the name the way extractall() does, so no member can
+            # end up outside of "destination": drop any root, "." and ".."
+            # parts, and replace characters that Windows does not allow
+            parts: list[str] = [
+                part
+                for part in member.filename.replace("\\", "/").split("/")
+                if part not in ("", ".", "..")
+            ]
+            if os.name == "nt":
+                parts = [
+                    stripped
+                    for part in parts
+                    if (
+                        stripped := part.translate(WINDOWS_ILLEGAL).rstrip(".")
+                    )
+                ]
+            if not parts:
+                continue
+            target: Path = destination.joinpath(*parts)
+            if member.is_dir():
+                mkdir_p(str(target))
+                continue
+            mkdir_p(str(target.parent))
+            target_key: str = os.path.normcase(str(target)).casefold()
+            if member.file_size == 0:
+                # Nothing to decompress, e.g. an empty cover image
+                open(target, "wb").close()
+                to_extract.pop(target_key, None)
+                continue
+            to_extract[target_key] = (target, member)
+
+        if not to_extract:
+            return
+
+        def extract_member(
+            target: Path, member: zipfile.ZipInfo, src: IO[bytes]
+        ) -> None:
+            with open(target, "wb") as dst:
+                # Use cast because ZipFile.open() is typed as returning
+                # IO[bytes], but we know it's a ZipExtFile with readinto();
+                # there is no need for a buffer bigger than the member itself
+                copy_fileobj(
+                    cast(SupportsReadinto, src),
+                    dst,
+                    min(member.file_size, COPY_BUFFER_SIZE),
+                )
+
+        # Open and close every member in this thread, as ZipFile's count of
+        # open members is not thread-safe; reading them from other threads
+        # is, as ZipFile serializes access to the underlying file
+        sources: list[IO[bytes]] = []
+        try:
+            for _, member in to_extract.values():
+                sources.append(zip_ref.open(member))
+            with ThreadPoolExecutor(
+                max_workers=min(8, len(to_extract))
+            ) as executor:
+                # list() so that any exception from a worker is raised here
+                list(
+                    executor.map(
+                        extract_member,
+                        [target for target, _ in to_extract.values()],
+                        [member for _, member in to_extract.values()],
+                        sources,
+                    )
+                )
+        finally:
+            for src in sources:
+                src.close()
+
+
+def read_ogg_vorbis_length(file: BinaryIO) -> float | None:
+    """
+    Read the length in seconds of an Ogg Vorbis file from its Ogg pages.
+
+    Only the sample rate in the identification header at the start of the
+    file and the granule position (the sample count) of the last page at its
+    end are read, so the comment and setup headers are never parsed.
+
+    Returns:
+        The length in seconds, or None if the file is not laid out as
+        expected
+    """
+    head: bytes = file.read(512)
+    try:
+        # Page header: capture pattern, version, header type, granule
+        # position, serial number, sequence number, CRC, segment count,
+        # followed by the segment table and then the first packet
+        serial: int = struct.unpack_from("<I", head, 14)[0]
+        packet_start: int = 27 + head[26]
+        packet_type: bytes = head[packet_start : packet_start + 7]
+        if head[:4] != b"OggS" or packet_type != b"\x01vorbis":
+            return None
+        sample_rate: int = struct.unpack_from("<I", head, packet_start + 12)[0]
+        if sample_rate == 0:
+            return None
+        file.seek(max(0, os.fstat(file.fileno()).st_size - OGG_TAIL_SIZE))
+        tail: bytes = file.read()
+        page_start: int = tail.rfind(b"OggS")
+        while page_start >= 0:
+            if len(tail) - page_start >= 27 and tail[page_start + 4] == 0:
+                granule_position: int
+                page_serial: int
+                granule_position, page_serial = struct.unpack_from(
+                    "<qI", tail, page_start + 6
+                )
+                # A granule position of -1 means no packet ends on the page
+                if page_serial == serial and granule_position >= 0:
+                    return granule_position / sample_rate
+            page_start = tail.rfind(b"OggS", 0, page_start)
+    except (IndexError, struct.error):
+        pass
+    return None
+
+
+def ogg_vorbis_length(path: os.PathLike[str] | str) -> float:
+    """Get the length in seconds of the Ogg Vorbis file at "path"."""
+    with open(path, "rb") as file:
+        length: float | None = read_ogg_vorbis_length(file)
+    if length is None:
+        from mutagen.oggvorbis import OggVorbis
+
+        ogg_file = OggVorbis(path)  # type: ignore[no-untyped-call]
+        length = ogg_file.info.length  # type: ignore[attr-defined]
+    return cast(float, length)
+
+
+def dumps_json(obj: Any) -> bytes:
+    """
+    Serialize "obj" to UTF-8 encoded JSON.
+
+    orjson is used when installed, as it is several times faster than the
+    stdlib encoder on the large event lists we produce; it emits bytes
+    directly, so there is no intermediate str to re-encode on write.
+
+    The output is always compact: no orjson options (OPT_INDENT_2 roughly
+    doubles its serialization time), and no whitespace after separators or
+    escaping of non-ASCII characters for the stdlib fallback, so both
+    produce the same output.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return JSON_ENCODER.encode(obj).encode("utf-8")
+
+
+def loads_json(data: bytes) -> Any:
+    """Parse UTF-8 encoded JSON, using orjson if available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_json(path: os.PathLike[str] | str) -> Any:
+    """Parse the JSON file at "path", using orjson if available."""
+    with open(path, "rb") as file:
+        return loads_json(file.read())
+
+
+def write_ats(at_map: dict[str, Any], file: BinaryIO) -> None:
+    """
+    Write an Audio Trip map to "file" as JSON.
+
+    Each choreography is serialized and written on its own, so at most one
+    difficulty's serialized JSON is held in memory next to the map itself,
+    rather than the serialized JSON of the whole file.
+    """
+    file.write(b'{"metadata":')
+    file.write(dumps_json(at_map["metadata"]))
+    file.write(b',"choreographies":{"list":[')
+    for i, choreography in enumerate(at_map["choreographies"]["list"]):
+        if i:
+            file.write(b",")
+        file.write(dumps_json(choreography))
+    file.write(b"]}}")
+
+
+@functools.lru_cache(maxsize=256)
 def seed_from_string(s: str) -> int:
     """Generate a 64-bit integer seed from a string using SHA256."""
     digest = hashlib.sha256(s.encode("utf-8")).digest()
     return int.from_bytes(digest[:8], "big")  # 64-bit seed
 
 
+@functools.cache
+def beat_fractions(
+    max_denominator: int,
+) -> tuple[list[float], list[tuple[int, int]]]:
+    """
+    List every fraction of a beat from 0 to 1 up to a maximum denominator.
+
+    Args:
+        max_denominator: Largest denominator allowed for the fractions
+
+    Returns:
+        The fractions' values in ascending order, and the numerator and
+        denominator, in lowest terms, of the fraction with each value
+    """
+    fractions: dict[float, tuple[int, int]] = {}
+    for den in range(max_denominator, 0, -1):
+        for num in range(den + 1):
+            divisor: int = math.gcd(num, den)
+            fractions[num / den] = (num // divisor, den // divisor)
+    values: list[float] = sorted(fractions)
+    return values, [fractions[value] for value in values]
+
+
+@functools.lru_cache(maxsize=4096)
+def quantize_fraction(
+    remainder: float, max_denominator: int
+) -> tuple[int, int, int]:
+    """
+    Find the nearest fraction to "remainder", a fraction of a beat.
+
+    Gives the same result as Fraction(remainder).limit_denominator(
+    max_denominator) for the small denominators used here, but just
+    bisects a precomputed table of fractions instead of building any
+    Fraction objects. Notes overwhelmingly sit on the same few fractions of
+    a beat, so the results are cached.
+
+    Args:
+        remainder: Fraction of a beat, at least 0 and less than 1
+        max_denominator: Largest denominator allowed for the fraction
+
+    Returns:
+        1 if "remainder" rounds up to the next whole beat and 0 otherwise,
+        and the numerator and denominator of the fraction in lowest terms
+    """
+    values, fractions = beat_fractions(max_denominator)
+    # The table starts at 0 and ends at 1, so as 0 <= remainder < 1 there is
+    # always a fraction at "above", and one at "above - 1" unless it is 0
+    above: int = bisect.bisect_left(values, remainder)
+    nearest: int = above
+    if above > 0:
+        below: int = above - 1
+        below_error: float = remainder - values[below]
+        above_error: float = values[above] - remainder
+        # On a tie, prefer the smaller denominator, then the lower fraction
+        if below_error < above_error or (
+            below_error == above_error
+            and fractions[below][1] <= fractions[above][1]
+        ):
+            nearest = below
+    numerator, denominator = fractions[nearest]
+    if numerator == denominator:
+        return 1, 0, 1
+    return 0, numerator, denominator
+
+
+def quantize_beat(beat: float, max_denominator: int) -> tuple[int, int, int]:
+    """
+    Split a beat into its whole beat and the nearest fraction of a beat.
+
+    Args:
+        beat: Beat time of the note
+        max_denominator: Largest denominator allowed for the fraction
+
+    Returns:
+        The whole beat, and the numerator and denominator of the remaining
+        fraction of a beat in lowest terms
+    """
+    whole_beat: int = math.floor(beat)
+    carry, numerator, denominator = quantize_fraction(
+        beat - whole_beat, max_denominator
+    )
+    return whole_beat + carry, numerator, denominator
+
+
+def convert_color_notes(
+    color_notes: list[dict[str, Any]],
+    local_random: random.Random,
+    position_xs: list[float],
+    position_ys: list[float],
+    lane_count: int,
+    x_wobble: float,
+    y_wobble: float,
+    beats_per_measure: int,
+) -> list[dict[str, Any]]:
+    """
+    Convert one difficulty's Beat Saber color notes to Audio Trip events.
+
+    This is the per-note hot path of the converter, kept free of any I/O.
+
+    Args:
+        color_notes: The difficulty's "colorNotes"
+        local_random: Seeded random number generator for the wobble
+        position_xs: Audio Trip X position of each grid cell, indexed by
+            y * lane_count + x
+        position_ys: Audio Trip Y position of each grid cell, indexed the
+            same way
+        lane_count: Number of lanes in the grid
+        x_wobble: Maximum X-axis offset added to each note
+        y_wobble: Maximum Y-axis offset added to each note
+        beats_per_measure: Largest denominator for a note's fraction of a
+            beat
+
+    Returns:
+        The Audio Trip events, in the same order as the notes
+    """
+    # Bind what the per-note loop looks up to locals, as local lookups
+    # are cheaper than global and attribute ones
+    next_random = local_random.random
+    quantize = quantize_beat
+    # All events share one empty subPositions list instead of allocating
+    # one each; nothing mutates it before it is serialized
+    no_sub_positions: list[dict[str, Any]] = []
+    layer_count: int = len(position_xs) // lane_count
+    at_events: list[dict[str, Any]] = []
+    append_event = at_events.append
+    for e in color_notes:
+        x: int = e["x"]
+        y: int = e["y"]
+        # With the flat tables an out-of-range lane or layer would silently
+        # wrap onto another cell (or fail with a bare IndexError)
+        if not (0 <= x < lane_count and 0 <= y < layer_count):
+            raise ValueError(
+                f"note at beat {e['b']} is outside of the {lane_count} "
+                f"supported lanes or {layer_count} supported layers"
+            )
+        whole_beat, numerator, denominator = quantize(
+            e["b"], beats_per_measure
+        )
+        cell: int = y * lane_count + x
+        append_event(
+            {
+                "type": (1 if e["c"] == 0 else 2),  # TODO (conversions)
+                "hasGuide": False,
+                "time": {
+                    "beat": whole_beat,
+                    "numerator": numerator,
+                    "denominator": denominator,
+                },
+                "beatDivision": 2,
+                # The x wobble is drawn before the y one, as the dict
+                # literal is evaluated in order
+                "position": {
+                    "x": position_xs[cell]
+                    + x_wobble * (next_random() * 2 - 1),
+                    "y": position_ys[cell]
+                    + y_wobble * (next_random() * 2 - 1),
+                    "z": 0.0,
+                },
+                "subPositions": no_sub_positions,
+                "broadcastEventID": 0,
+            }
+        )
+    return at_events
+
+
+def build_choreography(
+    difficulty_beatmap: dict[str, Any],
+    bs_map_file_path: Path,
+    at_njs_multiplier: float,
+    wobble_seed: int,
+    position_xs: list[float],
+    position_ys: list[float],
+    lane_count: int,
+    x_wobble: float,
+    y_wobble: float,
+    beats_per_measure: int,
+) -> dict[str, Any]:
+    """
+    Convert one Beat Saber difficulty to an Audio Trip choreography.
+
+    Only depends on its arguments, so that difficulties can be converted in
+    separate processes.
+
+    Args:
+        difficulty_beatmap: The difficulty's entry in Info.dat
+        bs_map_file_path: Path to the difficulty's .dat file
+        at_njs_multiplier: Note jump speed multiplier
+        wobble_seed: Seed for the wobble randomization
+        position_xs: Audio Trip X position of each grid cell, indexed by
+            y * lane_count + x
+        position_ys: Audio Trip Y position of each grid cell, indexed the
+            same way
+        lane_count: Number of lanes in the grid
+        x_wobble: Maximum X-axis offset added to each note
+        y_wobble: Maximum Y-axis offset added to each note
+        beats_per_measure: Largest denominator for a note's fraction of a
+            beat
+
+    Returns:
+        The choreography, with its header and events
+    """
+    bs_map_json: dict[str, Any] = load_json(bs_map_file_path)
+    color_notes: list[dict[str, Any]] = bs_map_json["colorNotes"]
+    try:
+        at_events: list[dict[str, Any]] = convert_color_notes(
+            color_notes,
+            random.Random(wobble_seed),
+            position_xs,
+            position_ys,
+            lane_count,
+            x_wobble,
+            y_wobble,
+            beats_per_measure,
+        )
+    except ValueError as error:
+        raise ValueError(f"{bs_map_file_path.name}: {error}") from None
+    return {
+        "header": {
+            "id": "cust_beat_saber_map",
+            "descriptor": "",
+            "name": difficulty_beatmap["_difficulty"],
+            "metadata": "",
+            "spawnAheadTime": {  # TODO (6)
+                "beat": 8,
+                "numerator": 0,
+                "denominator": 1,
+            },
+            "gemSpeed": difficulty_beatmap["_noteJumpMovementSpeed"]
+            * at_njs_multiplier,  # TODO (7)
+            "gemRadius": 1.0,
+            "handRadius": 0.27000001072883608,
+            "animClipPath": "",
+            "buildVersion": "",
+            "requiredModalities": 2,
+            "choreoType": 0,
+        },
+        "data": {"events": at_events},
+    }
+
+
+def build_choreographies(
+    build: Callable[[dict[str, Any], Path], dict[str, Any]],
+    difficulty_beatmaps: list[dict[str, Any]],
+    bs_map_file_paths: list[Path],
+    jobs: int = 1,
+) -> list[dict[str, Any]]:
+    """
+    Convert every difficulty, in separate processes if asked to.
+
+    Args:
+        build: build_choreography() with everything but its first two
+            arguments bound; must be picklable when jobs > 1
+        difficulty_beatmaps: Each difficulty's entry in Info.dat
+        bs_map_file_paths: Path to each difficulty's .dat file
+        jobs: Number of processes to convert the difficulties in; the
+            default of 1 converts them in this process
+
+    Returns:
+        The choreographies, in the same order as the difficulties
+    """
+    if jobs > 1 and len(difficulty_beatmaps) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(difficulty_beatmaps))
+        ) as executor:
+            # executor.map() yields results in submission order
+            return list(
+                executor.map(build, difficulty_beatmaps, bs_map_file_paths)
+            )
+    return list(map(build, difficulty_beatmaps, bs_map_file_paths))
+
+
 def generate_song_id(*args: Any) -> str:
     """
     Generate a unique ID based on an arbitrary number of arguments of any type.
@@ -70,11 +604,159 @@ def generate_song_id(*args: Any) -> str:
     Returns:
         A unique SHA256 hash as a hexadecimal string
     """
-    # Convert all arguments to strings using repr() for consistent
-    # representation. repr() handles None, bool, numbers, strings, etc.
-    # consistently
-    song_id_str: str = "".join(repr(arg) for arg in args)
-    return hashlib.sha256(song_id_str.encode("utf-8")).hexdigest()
+    # Hash each argument's repr() for consistent representation - repr()
+    # handles None, bool, numbers, strings, etc. consistently. A NUL after
+    # each one keeps e.g. ("a", "b") and ("ab",) from hashing the same
+    song_id_hash = hashlib.sha256()
+    for arg in args:
+        song_id_hash.update(repr(arg).encode("utf-8"))
+        song_id_hash.update(b"\x00")
+    return song_id_hash.hexdigest()
+
+
+def fetch_map_metadata(
+    session: "requests.Session",
+    bsr_code: str,
+    beatsaver_api_url: str,
+    cache_dir: Path | None,
+) -> dict[str, Any]:
+    """
+    Fetch a map's BeatSaver metadata, revalidating any cached copy.
+
+    Args:
+        session: Session to make the request with
+        bsr_code: BeatSaver BSR code for the map
+        beatsaver_api_url: BeatSaver API URL
+        cache_dir: Directory to cache the metadata and its ETag in, or
+            None to always fetch it afresh
+
+    Returns:
+        The map's metadata
+    """
+    cache_file: Path | None = (
+        None if cache_dir is None else cache_dir / f"{bsr_code}.json"
+    )
+    cached: dict[str, Any] | None = None
+    headers: dict[str, str] = {}
+    if cache_file is not None and cache_file.is_file():
+        try:
+            cached = load_json(cache_file)
+        except ValueError:
+            cached = None
+        if (
+            isinstance(cached, dict)
+            and isinstance(cached.get("etag"), str)
+            and "metadata" in cached
+        ):
+            headers["If-None-Match"] = cached["etag"]
+        else:
+            # Treat a cache file we cannot use as a miss rather than failing
+            # every later conversion of the map; it is rewritten below
+            cached = None
+            os.remove(cache_file)
+    response: requests.Response = session.get(
+        f"{beatsaver_api_url}/maps/id/{bsr_code}", headers=headers
+    )
+    if cached is not None and response.status_code == 304:
+        return cast(dict[str, Any], cached["metadata"])
+    response.raise_for_status()
+    metadata: dict[str, Any] = loads_json(response.content)
+    etag: str | None = response.headers.get("ETag")
+    if cache_file is not None and etag is not None:
+        # Only move the file into place once it is complete, so that an
+        # interrupted run never leaves a truncated one behind
+        partial_cache_file: Path = cache_file.with_name(
+            cache_file.name + ".part"
+        )
+        with safe_open_w(partial_cache_file, "wb") as file:
+            file.write(dumps_json({"etag": etag, "metadata": metadata}))
+        os.replace(partial_cache_file, cache_file)
+    return metadata
+
+
+def download_fileobj(
+    session: "requests.Session", url: str, file: BinaryIO
+) -> None:
+    """
+    Download a file into an open binary file object.
+
+    Args:
+        session: Session to make the request with
+        url: URL to download
+        file: File object to write the download to
+    """
+    # Stream straight to the file rather than holding all of it in memory
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        # Still undo any Content-Encoding, as .content would have
+        response.raw.decode_content = True
+        copy_fileobj(response.raw, file)
+
+
+def download_file(
+    session: "requests.Session", url: str, destination: Path
+) -> None:
+    """
+    Download a file, only moving it into place once it is complete.
+
+    Args:
+        session: Session to make the request with
+        url: URL to download
+        destination: Where to save the file
+    """
+    partial_destination: Path = destination.with_name(
+        destination.name + ".part"
+    )
+    with safe_open_w(partial_destination, "wb") as file:
+        download_fileobj(session, url, file)
+    os.replace(partial_destination, destination)
+
+
+def download_map(
+    session: "requests.Session",
+    map_download_url: str,
+    map_hash: str,
+    cache_dir: Path | None,
+    destination: Path,
+) -> None:
+    """
+    Download a map's zip and extract it, reusing a cached zip if there is one.
+
+    Args:
+        session: Session to make the request with
+        map_download_url: URL of the map's zip
+        map_hash: The map's hash, which the cached zip is named after
+        cache_dir: Directory to cache the zip in, or None to not keep it
+        destination: Directory to extract the map into
+    """
+    import zipfile
+
+    if cache_dir is None:
+        # The zip is not kept, so download it into an anonymous temporary
+        # file rather than one we have to clean up ourselves
+        with tempfile.TemporaryFile() as map_zipfile:
+            download_fileobj(session, map_download_url, map_zipfile)
+            map_zipfile.seek(0)
+            extract_zip(map_zipfile, destination)
+        return
+
+    # The hash changes whenever the map does, so a cached zip never needs
+    # revalidating
+    map_zipfile_location: Path = cache_dir / f"{map_hash}.zip"
+    was_cached: bool = map_zipfile_location.is_file()
+    if not was_cached:
+        download_file(session, map_download_url, map_zipfile_location)
+    try:
+        extract_zip(map_zipfile_location, destination)
+    except zipfile.BadZipFile:
+        # Never leave a corrupt zip in the cache, or every later conversion
+        # of the map would fail too; one that was already there may just
+        # have been damaged since, so download it once more
+        os.remove(map_zipfile_location)
+        if not was_cached:
+            raise
+        download_file(session, map_download_url, map_zipfile_location)
+        extract_zip(map_zipfile_location, destination)
 
 
 def converter(
@@ -91,6 +773,8 @@ def converter(
     y_wobble_factor: float,
     base_directory: Path,
     beatsaver_api_url: str,
+    jobs: int = 1,
+    use_cache: bool = False,
 ) -> None:
     """
     Convert a Beat Saber map to Audio Trip format.
@@ -110,59 +794,67 @@ def converter(
         y_wobble_factor: Y-axis wobble randomization factor
         base_directory: Base directory for downloads
         beatsaver_api_url: BeatSaver API URL
+        jobs: Number of processes to convert the difficulties in; the
+            default of 1 converts them in this process
+        use_cache: Whether to keep BeatSaver metadata and map zips in
+            base_directory/cache and reuse them on later conversions
     """
-    map_metadata_response: requests.Response = requests.get(
-        f"{beatsaver_api_url}/maps/id/{bsr_code}"
-    )
-    map_metadata_response.raise_for_status()
-    map_metadata: dict[str, Any] = map_metadata_response.json()
-    map_download_url: str = map_metadata["versions"][0]["downloadURL"]
-    map_hash: str = map_metadata["versions"][0]["hash"]
-    map_downloads_dir: Path = base_directory / "downloaded"
-    map_response: requests.Response = requests.get(map_download_url)
-    map_response.raise_for_status()
-    map_filename: str = pyrfc6266.requests_response_to_filename(map_response)
-    map_zipfile_location: Path = map_downloads_dir / map_filename
-    with safe_open_w(map_zipfile_location, "wb") as file:
-        file.write(map_response.content)
-    map_folder_dir: Path = map_downloads_dir / Path(map_filename).stem
-    with zipfile.ZipFile(map_zipfile_location, "r") as zip_ref:
-        zip_ref.extractall(map_folder_dir)
-    os.remove(map_zipfile_location)
+    # Imported here rather than at module level, as it is only needed for
+    # an actual conversion and is slow to import
+    import requests
+
+    cache_dir: Path | None = base_directory / "cache" if use_cache else None
+    # One session for both requests, so a connection to a host is reused
+    # rather than set up again
+    with requests.Session() as session:
+        map_metadata: dict[str, Any] = fetch_map_metadata(
+            session, bsr_code, beatsaver_api_url, cache_dir
+        )
+        map_download_url: str = map_metadata["versions"][0]["downloadURL"]
+        map_hash: str = map_metadata["versions"][0]["hash"]
+        map_folder_dir: Path = base_directory / "downloaded" / map_hash
+        download_map(
+            session, map_download_url, map_hash, cache_dir, map_folder_dir
+        )
 
     bs_downloaded_maps_dir: Path = map_folder_dir
     # Find Info.dat with only the "I" being case-insensitive
-    bs_info_file_path: Path | None = None
-    for path_item in bs_downloaded_maps_dir.iterdir():
-        if path_item.is_file() and path_item.name in (
-            "Info.dat",
-            "info.dat",
-        ):
-            bs_info_file_path = path_item
-            break
+    bs_info_file_path: str | None = None
+    # scandir gets whether each entry is a file from the directory listing
+    # itself, rather than stat-ing every file in the map
+    with os.scandir(bs_downloaded_maps_dir) as entries:
+        for entry in entries:
+            if entry.name in ("Info.dat", "info.dat") and entry.is_file():
+                bs_info_file_path = entry.path
+                break
     if bs_info_file_path is None:
         raise FileNotFoundError(
             f"Could not find Info.dat or info.dat in {bs_downloaded_maps_dir}"
         )
-    bs_info_json: dict[str, Any]
-    with open(bs_info_file_path) as bs_info_file:
-        bs_info_json = json.load(bs_info_file)
+    bs_info_json: dict[str, Any] = load_json(bs_info_file_path)
 
     difficulty_beatmaps: list[dict[str, Any]] = bs_info_json[
         "_difficultyBeatmapSets"
     ][0]["_difficultyBeatmaps"]
     difficulty_files: list[str] = [
-        difficulty_beatmaps[i]["_beatmapFilename"]
-        for i in range(len(difficulty_beatmaps))
+        difficulty_beatmap["_beatmapFilename"]
+        for difficulty_beatmap in difficulty_beatmaps
     ]
 
+    song_name: str = bs_info_json["_songName"]
+    song_author_name: str = bs_info_json["_songAuthorName"]
+    song_sub_name: str = bs_info_json["_songSubName"]
+    level_author_name: str = bs_info_json["_levelAuthorName"]
     at_song_file_name: str = (
-        bs_info_json["_songName"]
-        + " - "
-        + bs_info_json["_songAuthorName"]
-        + " "
-        + bs_info_json["_songSubName"]
-        + ".ogg"
+        f"{song_name} - {song_author_name} {song_sub_name}.ogg"
+    )
+    at_map_dir_name: str = (
+        f"{song_author_name} • {song_name} {song_sub_name}"
+        f" - {level_author_name}"
+    )
+    at_map_file_stem: str = (
+        f"{song_author_name} - {song_name} {song_sub_name}"
+        f" - {level_author_name}"
     )
 
     song_id: str = generate_song_id(
@@ -186,11 +878,11 @@ def converter(
             "custom": True,
             "authorID": {
                 "platformID": "OC",  # TODO (15)
-                "displayName": bs_info_json["_levelAuthorName"],
+                "displayName": level_author_name,
             },
             "songID": song_id,
-            "title": bs_info_json["_songName"],
-            "artist": bs_info_json["_songAuthorName"],
+            "title": song_name,
+            "artist": song_author_name,
             "koreography": {"m_FileID": 0, "m_PathID": 0},  # TODO (15)
             "descriptor": "",  # TODO (15)
             "sceneName": "Universal",  # TODO (15)
@@ -231,130 +923,85 @@ def converter(
         },
         "choreographies": {"list": []},
     }
-    for j, bs_map_file_name in enumerate(difficulty_files):
-        bs_map_file_path: Path = bs_downloaded_maps_dir / bs_map_file_name
+    song_file: Path = bs_downloaded_maps_dir / bs_info_json["_songFilename"]
+    song_length: float = ogg_vorbis_length(song_file)
+    at_map_output_json["metadata"]["songEndTimeInSeconds"] = song_length
+    at_map_output_json["metadata"]["songFullLengthInSeconds"] = song_length
 
-        bs_map_json: dict[str, Any] = {}
+    bs_x_range: float = (
+        3  # left-most centre to right-most in-line; # TODO (c1)
+    )
+    bs_y_range: float = 2  # bottom-most centre to top-most centre in-line
+    x_scale: float = at_x_range / bs_x_range
+    y_scale: float = at_y_range / bs_y_range
+    x_wobble: float = x_scale * x_wobble_factor
+    y_wobble: float = y_scale * y_wobble_factor
+    # Remember the y axis is flipped here - top is at bottom, bottom is on
+    # top; TODO (c1): this needs to be bigger for maps with >4 lanes
+    positions: list[list[tuple[float, float]]] = [
+        [
+            (-x_scale * 3 / 2, at_y_min + y_scale / 2),
+            (-x_scale / 2, at_y_min + y_scale / 2),
+            (x_scale / 2, at_y_min + y_scale / 2),
+            (x_scale * 3 / 2, at_y_min + y_scale / 2),
+        ],
+        [
+            (-x_scale * 3 / 2, at_y_min + y_scale * 3 / 2),
+            (-x_scale / 2, at_y_min + y_scale * 3 / 2),
+            (x_scale / 2, at_y_min + y_scale * 3 / 2),
+            (x_scale * 3 / 2, at_y_min + y_scale * 3 / 2),
+        ],
+        [
+            (-x_scale * 3 / 2, at_y_min + y_scale * 5 / 2),
+            (-x_scale / 2, at_y_min + y_scale * 5 / 2),
+            (x_scale / 2, at_y_min + y_scale * 5 / 2),
+            (x_scale * 3 / 2, at_y_min + y_scale * 5 / 2),
+        ],
+    ]
+    # Flattened into separate x and y tables indexed by
+    # y * lane_count + x, so a note's position is one lookup per axis
+    lane_count: int = len(positions[0])
+    position_xs: list[float] = [x for row in positions for x, _ in row]
+    position_ys: list[float] = [y for row in positions for _, y in row]
 
-        with open(bs_map_file_path) as bs_map_file:
-            bs_map_json = json.load(bs_map_file)
-        at_map_output_json["choreographies"]["list"].append({})
-        at_map_output_json["choreographies"]["list"][j]["header"] = {
-            "id": "cust_beat_saber_map",
-            "descriptor": "",
-            "name": difficulty_beatmaps[j]["_difficulty"],
-            "metadata": "",
-            "spawnAheadTime": {  # TODO (6)
-                "beat": 8,
-                "numerator": 0,
-                "denominator": 1,
-            },
-            "gemSpeed": difficulty_beatmaps[j]["_noteJumpMovementSpeed"]
-            * at_njs_multiplier,  # TODO (7)
-            "gemRadius": 1.0,
-            "handRadius": 0.27000001072883608,
-            "animClipPath": "",
-            "buildVersion": "",
-            "requiredModalities": 2,
-            "choreoType": 0,
-        }
-        at_map_output_json["choreographies"]["list"][j]["data"] = {
-            "events": []
-        }
-        at_events: list[dict[str, Any]] = at_map_output_json["choreographies"][
-            "list"
-        ][j]["data"]["events"]
-
-        song_file: Path = (
-            bs_downloaded_maps_dir / bs_info_json["_songFilename"]
-        )
-        ogg_file = OggVorbis(song_file)  # type: ignore[no-untyped-call]
-        song_length: float = ogg_file.info.length  # type: ignore[attr-defined]
-        at_map_output_json["metadata"]["songEndTimeInSeconds"] = song_length
-        at_map_output_json["metadata"]["songFullLengthInSeconds"] = song_length
+    # Every difficulty restarts its wobble from the same seed
+    wobble_seed: int = seed_from_string(song_id)
 
-        bs_x_range: float = (
-            3  # left-most centre to right-most in-line; # TODO (c1)
-        )
-        bs_y_range: float = 2  # bottom-most centre to top-most centre in-line
-        x_scale: float = at_x_range / bs_x_range
-        y_scale: float = at_y_range / bs_y_range
-        x_wobble: float = x_scale * x_wobble_factor
-        y_wobble: float = y_scale * y_wobble_factor
-        # Remember the y axis is flipped here - top is at bottom, bottom is on
-        # top; TODO (c1): this needs to be bigger for maps with >4 lanes
-        positions: list[list[tuple[float, float]]] = [
-            [
-                (-x_scale * 3 / 2, at_y_min + y_scale / 2),
-                (-x_scale / 2, at_y_min + y_scale / 2),
-                (x_scale / 2, at_y_min + y_scale / 2),
-                (x_scale * 3 / 2, at_y_min + y_scale / 2),
-            ],
-            [
-                (-x_scale * 3 / 2, at_y_min + y_scale * 3 / 2),
-                (-x_scale / 2, at_y_min + y_scale * 3 / 2),
-                (x_scale / 2, at_y_min + y_scale * 3 / 2),
-                (x_scale * 3 / 2, at_y_min + y_scale * 3 / 2),
-            ],
-            [
-                (-x_scale * 3 / 2, at_y_min + y_scale * 5 / 2),
-                (-x_scale / 2, at_y_min + y_scale * 5 / 2),
-                (x_scale / 2, at_y_min + y_scale * 5 / 2),
-                (x_scale * 3 / 2, at_y_min + y_scale * 5 / 2),
-            ],
-        ]
-
-        local_random: random.Random = random.Random(seed_from_string(song_id))
-        for e in bs_map_json["colorNotes"]:
-            beat: float = e["b"]
-            f: Fraction = Fraction(beat).limit_denominator(beats_per_measure)
-            whole_beat: int = f.numerator // f.denominator
-            remainder: Fraction = f - whole_beat
-            x_pos, y_pos = positions[e["y"]][e["x"]]
-            x_pos += x_wobble * (local_random.random() * 2 - 1)
-            y_pos += y_wobble * (local_random.random() * 2 - 1)
-            at_events.append(
-                {
-                    "type": (1 if e["c"] == 0 else 2),  # TODO (conversions)
-                    "hasGuide": False,
-                    "time": {
-                        "beat": whole_beat,
-                        "numerator": remainder.numerator,
-                        "denominator": remainder.denominator,
-                    },
-                    "beatDivision": 2,
-                    "position": {"x": x_pos, "y": y_pos, "z": 0.0},
-                    "subPositions": [],
-                    "broadcastEventID": 0,
-                }
-            )
+    build: functools.partial[dict[str, Any]] = functools.partial(
+        build_choreography,
+        at_njs_multiplier=at_njs_multiplier,
+        wobble_seed=wobble_seed,
+        position_xs=position_xs,
+        position_ys=position_ys,
+        lane_count=lane_count,
+        x_wobble=x_wobble,
+        y_wobble=y_wobble,
+        beats_per_measure=beats_per_measure,
+    )
+    bs_map_file_paths: list[Path] = [
+        bs_downloaded_maps_dir / bs_map_file_name
+        for bs_map_file_name in difficulty_files
+    ]
+    at_map_output_json["choreographies"]["list"] = build_choreographies(
+        build, difficulty_beatmaps, bs_map_file_paths, jobs
+    )
 
     # Save outputs
-    output_dir: Path = at_output_dir / (
-        bs_info_json["_songAuthorName"]
-        + " • "
-        + bs_info_json["_songName"]
-        + " "
-        + bs_info_json["_songSubName"]
-        + " - "
-        + bs_info_json["_levelAuthorName"]
-    )
+    output_dir: Path = at_output_dir / at_map_dir_name
     with safe_open_w(
-        output_dir
-        / (
-            bs_info_json["_songAuthorName"]
-            + " - "
-            + bs_info_json["_songName"]
-            + " "
-            + bs_info_json["_songSubName"]
-            + " - "
-            + bs_info_json["_levelAuthorName"]
-            + ".ats"
-        )
+        output_dir / f"{at_map_file_stem}.ats",
+        "wb",
     ) as output_file:
-        output_file.write(json.dumps(at_map_output_json))
+        write_ats(at_map_output_json, output_file)
 
-    shutil.copy2(song_file, output_dir / at_song_file_name)
+    # The extracted map is deleted below anyway, so move the song out of
+    # it rather than copying it where possible
+    at_song_file_path: Path = output_dir / at_song_file_name
+    try:
+        os.replace(song_file, at_song_file_path)
+    except OSError:
+        # e.g. the output directory is on a different file system
+        shutil.copy2(song_file, at_song_file_path)
 
     shutil.rmtree(bs_downloaded_maps_dir)
 
@@ -402,6 +1049,21 @@ def parse_args_and_run() -> None:
         type=str,
         default="https://api.beatsaver.com/",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes to convert difficulties in (default: 1)",
+    )
+    parser.add_argument(
+        "--cache",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help=(
+            "Keep downloaded maps and their metadata in the base directory"
+            " and reuse them on later conversions (default: off)"
+        ),
+    )
     args: argparse.Namespace = parser.parse_args()
 
     converter(
@@ -418,4 +1080,6 @@ def parse_args_and_run() -> None:
         y_wobble_factor=args.y_wobble_factor,
         base_directory=args.base_directory,
         beatsaver_api_url=args.beatsaver_api_url,
+        jobs=args.jobs,
+        use_cache=args.cache,
     )
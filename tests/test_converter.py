@@ -0,0 +1,393 @@
+import functools
+import io
+import json
+import random
+import struct
+import zipfile
+from fractions import Fraction
+from pathlib import Path
+
+import pytest
+
+from src.converter import (
+    build_choreographies,
+    build_choreography,
+    convert_color_notes,
+    download_file,
+    download_map,
+    extract_zip,
+    fetch_map_metadata,
+    generate_song_id,
+    ogg_vorbis_length,
+    quantize_beat,
+    read_ogg_vorbis_length,
+    write_ats,
+)
+
+
+@pytest.mark.parametrize("max_denominator", [1, 2, 4, 6])
+@pytest.mark.parametrize(
+    "beat",
+    [0, 0.25, 0.5, 0.75, 1, 1 / 3, 2 / 3, 0.125, 0.875, 3.99, 7.3333, 12.6],
+)
+def test_quantize_beat_matches_limit_denominator(
+    beat: float, max_denominator: int
+) -> None:
+    f = Fraction(beat).limit_denominator(max_denominator)
+    whole_beat = f.numerator // f.denominator
+    remainder = f - whole_beat
+    assert quantize_beat(beat, max_denominator) == (
+        whole_beat,
+        remainder.numerator,
+        remainder.denominator,
+    )
+
+
+def test_quantize_beat_rounds_up_to_next_whole_beat() -> None:
+    assert quantize_beat(3.99, 4) == (4, 0, 1)
+
+
+def ogg_page(packet: bytes, granule_position: int, flags: int = 0) -> bytes:
+    # Single-segment pages are enough here; the CRC is left as zero
+    return (
+        b"OggS"
+        + bytes([0, flags])
+        + struct.pack("<qIIIB", granule_position, 1, 0, 0, 1)
+        + bytes([len(packet)])
+        + packet
+    )
+
+
+def test_ogg_vorbis_length(tmp_path: Path) -> None:
+    identification = b"\x01vorbis" + struct.pack(
+        "<IBIiiiBB", 0, 2, 44100, 0, 128000, 0, 0xB8, 1
+    )
+    song = tmp_path / "song.ogg"
+    song.write_bytes(
+        ogg_page(identification, 0, flags=2)
+        + ogg_page(b"\x00" * 200, 44100 * 100)
+        + ogg_page(b"\x00" * 200, 44100 * 150)
+        + ogg_page(b"\x00" * 200, -1, flags=4)
+    )
+    with open(song, "rb") as file:
+        assert read_ogg_vorbis_length(file) == 150.0
+    assert ogg_vorbis_length(song) == 150.0
+
+
+def test_read_ogg_vorbis_length_rejects_other_files(tmp_path: Path) -> None:
+    not_ogg = tmp_path / "song.ogg"
+    not_ogg.write_bytes(b"RIFF" + b"\x00" * 100)
+    with open(not_ogg, "rb") as file:
+        assert read_ogg_vorbis_length(file) is None
+
+
+def test_generate_song_id() -> None:
+    assert generate_song_id("abc", 1.5, True) == generate_song_id(
+        "abc", 1.5, True
+    )
+    assert generate_song_id("a", "b") != generate_song_id("ab")
+    assert generate_song_id(1, 2) != generate_song_id(12)
+
+
+def test_convert_color_notes() -> None:
+    events = convert_color_notes(
+        [{"b": 2.5, "x": 1, "y": 2, "c": 0}, {"b": 3, "x": 3, "y": 0, "c": 1}],
+        random.Random(0),
+        position_xs=[float(i) for i in range(12)],
+        position_ys=[float(-i) for i in range(12)],
+        lane_count=4,
+        x_wobble=0.0,
+        y_wobble=0.0,
+        beats_per_measure=4,
+    )
+    assert [event["type"] for event in events] == [1, 2]
+    assert events[0]["time"] == {"beat": 2, "numerator": 1, "denominator": 2}
+    assert events[1]["time"] == {"beat": 3, "numerator": 0, "denominator": 1}
+    assert events[0]["position"] == {"x": 9.0, "y": -9.0, "z": 0.0}
+    assert events[1]["position"] == {"x": 3.0, "y": -3.0, "z": 0.0}
+
+
+def test_write_ats() -> None:
+    at_map = {
+        "metadata": {"title": "Song", "avgBPM": 128.5},
+        "choreographies": {
+            "list": [
+                {"header": {"name": "Hard"}, "data": {"events": [{}]}},
+                {"header": {"name": "Expert"}, "data": {"events": []}},
+            ]
+        },
+    }
+    file = io.BytesIO()
+    write_ats(at_map, file)
+    assert json.loads(file.getvalue()) == at_map
+
+
+def test_extract_zip_keeps_members_inside_destination(tmp_path: Path) -> None:
+    archive = tmp_path / "map.zip"
+    with zipfile.ZipFile(archive, "w") as zip_ref:
+        zip_ref.writestr("Info.dat", b"{}")
+        zip_ref.writestr("sub/ExpertPlus.dat", b"[]")
+        zip_ref.writestr("../escaped.dat", b"..")
+        zip_ref.writestr("/absolute.dat", b"/")
+        zip_ref.writestr("empty/", b"")
+        zip_ref.writestr("cover.jpg", b"")
+    destination = tmp_path / "map"
+    extract_zip(archive, destination)
+    assert sorted(
+        path.relative_to(destination).as_posix()
+        for path in destination.rglob("*")
+    ) == [
+        "Info.dat",
+        "absolute.dat",
+        "cover.jpg",
+        "empty",
+        "escaped.dat",
+        "sub",
+        "sub/ExpertPlus.dat",
+    ]
+    assert (destination / "sub" / "ExpertPlus.dat").read_bytes() == b"[]"
+    assert not (tmp_path / "escaped.dat").exists()
+
+
+def test_extract_zip_names_differing_only_in_case(tmp_path: Path) -> None:
+    archive = tmp_path / "map.zip"
+    with zipfile.ZipFile(archive, "w") as zip_ref:
+        zip_ref.writestr("Hard.dat", b"first")
+        zip_ref.writestr("hard.dat", b"second")
+    destination = tmp_path / "map"
+    extract_zip(archive, destination)
+    assert [path.name for path in destination.iterdir()] == ["hard.dat"]
+    assert (destination / "hard.dat").read_bytes() == b"second"
+
+
+BUILD_TEST_CHOREOGRAPHY = functools.partial(
+    build_choreography,
+    at_njs_multiplier=2.8,
+    wobble_seed=5,
+    position_xs=[float(i) for i in range(12)],
+    position_ys=[float(i) / 2 for i in range(12)],
+    lane_count=4,
+    x_wobble=0.1,
+    y_wobble=0.1,
+    beats_per_measure=4,
+)
+
+
+def write_difficulty(
+    path: Path, notes: list[tuple[float, int, int, int]]
+) -> Path:
+    path.write_text(
+        json.dumps(
+            {
+                "colorNotes": [
+                    {"b": b, "x": x, "y": y, "c": c} for b, x, y, c in notes
+                ]
+            }
+        )
+    )
+    return path
+
+
+@pytest.mark.parametrize("x, y", [(4, 0), (-1, 0), (0, 3), (0, -1)])
+def test_build_choreography_rejects_notes_off_the_grid(
+    tmp_path: Path, x: int, y: int
+) -> None:
+    bs_map_file_path = write_difficulty(
+        tmp_path / "Hard.dat", [(1.0, x, y, 0)]
+    )
+    with pytest.raises(ValueError, match="lanes or 3 supported layers"):
+        BUILD_TEST_CHOREOGRAPHY(
+            {"_difficulty": "Hard", "_noteJumpMovementSpeed": 16},
+            bs_map_file_path,
+        )
+
+
+def test_build_choreographies_in_processes_matches_in_process(
+    tmp_path: Path,
+) -> None:
+    notes_random = random.Random(1)
+    difficulty_beatmaps = [
+        {"_difficulty": name, "_noteJumpMovementSpeed": njs}
+        for name, njs in [("Hard", 16), ("Expert", 18), ("ExpertPlus", 20)]
+    ]
+    bs_map_file_paths = [
+        write_difficulty(
+            tmp_path / f"{difficulty_beatmap['_difficulty']}.dat",
+            [
+                (
+                    beat / 4,
+                    notes_random.randrange(4),
+                    notes_random.randrange(3),
+                    notes_random.randrange(2),
+                )
+                for beat in range(50 * (i + 1))
+            ],
+        )
+        for i, difficulty_beatmap in enumerate(difficulty_beatmaps)
+    ]
+    in_process = build_choreographies(
+        BUILD_TEST_CHOREOGRAPHY, difficulty_beatmaps, bs_map_file_paths
+    )
+    assert [choreography["header"]["name"] for choreography in in_process] == [
+        "Hard",
+        "Expert",
+        "ExpertPlus",
+    ]
+    assert [
+        len(choreography["data"]["events"]) for choreography in in_process
+    ] == [50, 100, 150]
+    assert (
+        build_choreographies(
+            BUILD_TEST_CHOREOGRAPHY,
+            difficulty_beatmaps,
+            bs_map_file_paths,
+            jobs=2,
+        )
+        == in_process
+    )
+
+
+class FakeResponse:
+    def __init__(
+        self,
+        status_code: int = 200,
+        content: bytes = b"",
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.raw = io.BytesIO(content)
+
+    def __enter__(self) -> "FakeResponse":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise OSError(self.status_code)
+
+
+class FakeSession:
+    def __init__(self, *responses: FakeResponse) -> None:
+        self.responses = list(responses)
+        self.requests: list[tuple[str, dict[str, str]]] = []
+
+    def get(
+        self,
+        url: str,
+        headers: dict[str, str] | None = None,
+        stream: bool = False,
+    ) -> FakeResponse:
+        self.requests.append((url, headers or {}))
+        return self.responses.pop(0)
+
+
+METADATA = {"versions": [{"hash": "deadbeef", "downloadURL": "zip"}]}
+
+
+def test_fetch_map_metadata_caches_by_etag(tmp_path: Path) -> None:
+    session = FakeSession(
+        FakeResponse(200, json.dumps(METADATA).encode(), {"ETag": '"v1"'}),
+        FakeResponse(304),
+    )
+    for _ in range(2):
+        assert (
+            fetch_map_metadata(session, "abc", "https://api", tmp_path)
+            == METADATA
+        )
+    assert session.requests == [
+        ("https://api/maps/id/abc", {}),
+        ("https://api/maps/id/abc", {"If-None-Match": '"v1"'}),
+    ]
+
+
+@pytest.mark.parametrize(
+    "cache_contents", [b'{"etag": "\\"v1\\"", "metad', b'{"metadata": {}}']
+)
+def test_fetch_map_metadata_ignores_unusable_cache_file(
+    tmp_path: Path, cache_contents: bytes
+) -> None:
+    (tmp_path / "abc.json").write_bytes(cache_contents)
+    session = FakeSession(
+        FakeResponse(200, json.dumps(METADATA).encode(), {"ETag": '"v2"'})
+    )
+    assert (
+        fetch_map_metadata(session, "abc", "https://api", tmp_path) == METADATA
+    )
+    assert session.requests == [("https://api/maps/id/abc", {})]
+    assert json.loads((tmp_path / "abc.json").read_bytes()) == {
+        "etag": '"v2"',
+        "metadata": METADATA,
+    }
+    assert [path.name for path in tmp_path.iterdir()] == ["abc.json"]
+
+
+def test_fetch_map_metadata_without_etag_is_not_cached(
+    tmp_path: Path,
+) -> None:
+    session = FakeSession(FakeResponse(200, json.dumps(METADATA).encode()))
+    assert (
+        fetch_map_metadata(session, "abc", "https://api", tmp_path) == METADATA
+    )
+    assert not (tmp_path / "abc.json").exists()
+
+
+def test_download_file_moves_complete_file_into_place(tmp_path: Path) -> None:
+    destination = tmp_path / "map.zip"
+    download_file(
+        FakeSession(FakeResponse(content=b"zip")), "zip", destination
+    )
+    assert destination.read_bytes() == b"zip"
+    assert [path.name for path in tmp_path.iterdir()] == ["map.zip"]
+    with pytest.raises(OSError):
+        download_file(
+            FakeSession(FakeResponse(404)), "zip", tmp_path / "missing.zip"
+        )
+    assert not (tmp_path / "missing.zip").exists()
+
+
+def map_zip() -> bytes:
+    with io.BytesIO() as file:
+        with zipfile.ZipFile(file, "w") as zip_ref:
+            zip_ref.writestr("Info.dat", b"{}")
+        return file.getvalue()
+
+
+def test_download_map_reuses_cached_zip(tmp_path: Path) -> None:
+    cache_dir = tmp_path / "cache"
+    session = FakeSession(FakeResponse(content=map_zip()))
+    for i in range(2):
+        download_map(
+            session, "zip", "deadbeef", cache_dir, tmp_path / f"map{i}"
+        )
+        assert (tmp_path / f"map{i}" / "Info.dat").read_bytes() == b"{}"
+    assert len(session.requests) == 1
+    assert (cache_dir / "deadbeef.zip").read_bytes() == map_zip()
+
+
+def test_download_map_replaces_corrupt_cached_zip(tmp_path: Path) -> None:
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (cache_dir / "deadbeef.zip").write_bytes(b"not a zip")
+    session = FakeSession(FakeResponse(content=map_zip()))
+    download_map(session, "zip", "deadbeef", cache_dir, tmp_path / "map")
+    assert (tmp_path / "map" / "Info.dat").read_bytes() == b"{}"
+    assert (cache_dir / "deadbeef.zip").read_bytes() == map_zip()
+
+
+def test_download_map_does_not_cache_corrupt_download(tmp_path: Path) -> None:
+    cache_dir = tmp_path / "cache"
+    session = FakeSession(FakeResponse(content=b"not a zip"))
+    with pytest.raises(zipfile.BadZipFile):
+        download_map(session, "zip", "deadbeef", cache_dir, tmp_path / "map")
+    assert not (cache_dir / "deadbeef.zip").exists()
+
+
+def test_download_map_without_cache(tmp_path: Path) -> None:
+    session = FakeSession(FakeResponse(content=map_zip()))
+    download_map(session, "zip", "deadbeef", None, tmp_path / "map")
+    assert (tmp_path / "map" / "Info.dat").read_bytes() == b"{}"
+    assert [path.name for path in tmp_path.iterdir()] == ["map"]